@@ -1,78 +1,215 @@
 import datetime
 import inspect
+import io
 import logging
+import logging.handlers
+import os
+import pickle
+import selectors
 import socket
+import struct
+import tempfile
 import threading
 import time
-import traceback
 import uuid
 from argparse import ArgumentParser
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from functools import partial
 from multiprocessing.shared_memory import SharedMemory
 from queue import Empty, Queue
-from tqdm import tqdm
-from typing import Any
+from typing import Any, Callable, Iterator, Optional, Union
 
 import numpy as np
 from instamatic import config
 from instamatic.microscope.interface.simu_microscope import SimuMicroscope
-from instamatic.server.serializer import dumper, loader
+from instamatic.server.serializer import PROTOCOL, dumper, loader
 
 from simulation.camera import CameraEmulator
 
 
 _generators = {}
+_send_buffers = threading.local()  # per-thread reusable `io.BytesIO` for replies
 stop_program_event = threading.Event()
 
 TEM_PORT = config.settings.tem_server_port
 CAM_PORT = config.settings.cam_server_port
+TEM_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'emulator_tem.sock')
+CAM_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'emulator_cam.sock')
+MEMMAP_PATHS = tuple(
+    os.path.join(tempfile.gettempdir(), f'emulator_image{suffix}.dat')
+    for suffix in ('_A', '_B')
+)  # alternated whenever the layout i.e. shape or dtype of memmapped image changes
 BUFFER_SIZE = 1024
+FRAMING_MAGIC = b'\x00'  # sent once by clients opening a framed connection
+HEADER = struct.Struct('>I')  # big-endian length prefix of framed messages
+COMMAND_HEADER = struct.Struct('>IB')  # length prefix and tag of framed commands
+TAG_PAYLOAD = 0x00  # framed command carries a serialized payload
+TAG_EXIT = 0x01  # framed command asks to close the connection, no payload
+TAG_KILL = 0x02  # as above, kept to mirror the 'kill' message of instamatic
 NAME = 'emulator'
+IMAGE_FUNCS = frozenset(('get_image',))  # `get_movie` frames pass `__gen_next__`
 TIMEOUT = 0.5
+COPY_THREADS = 4
+CONNECTION_THREADS = 8  # maximum number of clients handled at once per device
+COPY_PARALLEL_THRESHOLD = 4 * 1024 ** 2  # bytes; smaller images are copied serially
+
+_copy_executor = ThreadPoolExecutor(max_workers=COPY_THREADS)
+_write_executor = ThreadPoolExecutor(max_workers=1)  # background image copies
 
 date = datetime.datetime.now().strftime('%Y-%m-%d')
 logfile = config.locations['logs'] / f'instamatic_TEM_emulator_{date}.log'
 logging_fmt = '%(asctime)s %(name)-4s: %(levelname)-8s %(message)s'
-logging.basicConfig(level=logging.INFO, filename=logfile, format=logging_fmt)
 
 
 class SharedImageProxy:
-    memory = None
+    buffers: list[Optional[SharedMemory]] = [None, None]  # double-buffered images
+    active = 1  # index of the buffer with the latest image; first push uses 0
+    last_write: Optional[Future] = None  # copy into `buffers[active]` in progress
+    _capacities = [0, 0]  # sizes of `buffers`, kept with headroom to avoid resizing
+    _views = [None, None]  # persistent ndarrays wrapping `buffers`
+    _view_keys = [None, None]  # (shape, dtype) of arrays wrapped by `_views`
+    version = 0  # incremented with every pushed image to identify new frames
+    memmap_threshold: Optional[int] = None  # push larger images to `MEMMAP_PATHS`
+    _memmap = None  # file-backed alternative to `buffers`, used for large images
+    _memmap_key = None  # (shape, dtype) of the array currently in `_memmap`
+    _memmap_index = 1  # index of `MEMMAP_PATHS` used by `_memmap`; first uses 0
 
     @classmethod
-    def initialize(cls, image_size: int) -> None:
-        cls.release()
+    def initialize(cls, index: int, image_size: int) -> None:
+        cls._release_buffer(index)
+        name = NAME + ('_A', '_B')[index]
         try:
-            cls.memory = SharedMemory(name=NAME, create=True, size=image_size)
+            memory = SharedMemory(name=name, create=True, size=image_size)
         except FileExistsError:  # if the stale shared memory exists somewhere
-            stale = SharedMemory(name=NAME)
+            stale = SharedMemory(name=name)
             stale.close()
             try:
                 stale.unlink()
             except FileNotFoundError:
                 pass
-            cls.memory = SharedMemory(name=NAME, create=True, size=image_size)
-        logging.info(f'New SharedMemory(name="{NAME}", size={image_size}) created')
+            memory = SharedMemory(name=name, create=True, size=image_size)
+        cls.buffers[index] = memory
+        cls._capacities[index] = image_size
+        logging.info('New SharedMemory(name="%s", size=%d) created', name, image_size)
+
+    @classmethod
+    def push(cls, image: np.ndarray) -> Union[dict[str, Any], Future]:
+        """Start copying `image` into the inactive shared memory buffer and
+        return a Future of the handle to read it, set when the copy is done.
+        This buffer held the image before the latest, which gets overwritten.
+        Images passed via memmap are written immediately, handle is returned"""
+        image = np.ascontiguousarray(image)
+        if cls.memmap_threshold is not None and image.nbytes > cls.memmap_threshold:
+            return cls.push_memmap(image)
+        if cls.last_write is not None:
+            cls.last_write.result()  # never write to both buffers at once
+        index = 1 - cls.active
+        key = (image.shape, image.dtype)
+        if cls.buffers[index] is None or image.nbytes > cls._capacities[index]:
+            image_size = max(image.nbytes, 2 * cls._capacities[index])
+            cls.initialize(index=index, image_size=image_size)
+        memory = cls.buffers[index]
+        if key != cls._view_keys[index]:  # view of leading bytes, new one if needed
+            flat = np.frombuffer(memory.buf, dtype=image.dtype, count=image.size)
+            cls._views[index] = flat.reshape(image.shape)
+            cls._view_keys[index] = key
+        cls.active = index
+        cls.version += 1
+        handle = {
+            'backend': 'shared_memory',
+            'name': memory.name,
+            'shape': image.shape,
+            'dtype': str(image.dtype),
+            'nbytes': image.nbytes,
+            'version': cls.version,
+        }
+        cls.last_write = _write_executor.submit(cls._copy, cls._views[index], image)
+        return _then(cls.last_write, handle)
 
     @classmethod
-    def push(cls, image) -> None:
-        image_size = image.nbytes
-        if cls.memory is None or cls.memory.size != image_size:
-            cls.initialize(image_size=image_size)
-        b = np.ndarray(image.shape, dtype=image.dtype, buffer=cls.memory.buf)
-        b[:] = image[:]
+    def _copy(cls, dst: np.ndarray, src: np.ndarray) -> None:
+        """Copy contiguous `src` into `dst`, in parallel if `src` is large"""
+        if src.nbytes > COPY_PARALLEL_THRESHOLD:
+            cls._copy_parallel(dst, src)
+        else:
+            np.copyto(dst, src, casting='no')
+
+    @classmethod
+    def push_memmap(cls, image: np.ndarray) -> dict[str, Any]:
+        """Copy `image` into a file-backed memmap and return a handle to it.
+        Images of the same layout overwrite the file in place, so clients must
+        copy the data before requesting the next image. A new layout is written
+        to the other of `MEMMAP_PATHS`, so the file a client may still map is
+        not truncated; this protects the previous layout only, not older ones"""
+        key = (image.shape, image.dtype)
+        if key != cls._memmap_key:
+            cls._memmap = None  # unmap first: mapped files can't be resized on Windows
+            cls._memmap_index = 1 - cls._memmap_index
+            path = MEMMAP_PATHS[cls._memmap_index]
+            cls._memmap = np.memmap(path, dtype=image.dtype, mode='w+', shape=image.shape)
+            cls._memmap_key = key
+            logging.info('New memmap(path="%s", size=%d) created', path, image.nbytes)
+        np.copyto(cls._memmap, image, casting='no')
+        cls._memmap.flush()
+        cls.version += 1
+        return {
+            'backend': 'memmap',
+            'path': MEMMAP_PATHS[cls._memmap_index],
+            'shape': image.shape,
+            'dtype': str(image.dtype),
+            'nbytes': image.nbytes,
+            'version': cls.version,
+        }
+
+    @staticmethod
+    def _copy_parallel(dst: np.ndarray, src: np.ndarray) -> None:
+        """Copy contiguous `src` into `dst` in bands using `COPY_THREADS`"""
+        dst_flat, src_flat = dst.reshape(-1), src.reshape(-1)
+        bounds = np.linspace(0, src_flat.size, COPY_THREADS + 1, dtype=int)
+        futures = [
+            _copy_executor.submit(np.copyto, dst_flat[s:e], src_flat[s:e], casting='no')
+            for s, e in zip(bounds[:-1], bounds[1:])
+        ]
+        for future in futures:
+            future.result()  # blocks until done, re-raises exceptions from workers
 
     @classmethod
     def release(cls) -> None:
-        if cls.memory is None:
+        if cls.last_write is not None:
+            cls.last_write.result()
+            cls.last_write = None
+        cls._memmap = None  # the files themselves are kept for inspection
+        cls._memmap_key = None
+        for index in range(len(cls.buffers)):
+            cls._release_buffer(index)
+
+    @classmethod
+    def _release_buffer(cls, index: int) -> None:
+        if (memory := cls.buffers[index]) is None:
             return
-        cls.memory.close()
+        cls._views[index] = None  # the view must be dropped before buffer closes
+        cls._view_keys[index] = None
+        memory.close()
         try:
-            cls.memory.unlink()
+            memory.unlink()
         except FileNotFoundError:
             pass
-        cls.memory = None
+        cls.buffers[index] = None
+
+
+def _then(future: Future, result: Any) -> Future:
+    """Return a Future that resolves with `result` once `future` is done"""
+    chained = Future()
+
+    def resolve(done: Future) -> None:
+        if (exception := done.exception()) is not None:
+            chained.set_exception(exception)
+        else:
+            chained.set_result(result)
+
+    future.add_done_callback(resolve)
+    return chained
 
 
 EmulatedDeviceImplementation = Any  # CameraBase/MicroscopeBase subclass instance
@@ -84,9 +221,8 @@ class EmulatedDeviceKind:
     name: str  # a human-readable noun that describes the device kind
     cls: EmulatedDeviceImplementation
     log: logging.Logger = field(default_factory=logging.getLogger)
-    queue: Queue = field(default_factory=partial(Queue, maxsize=100))
-    response_cache: list[tuple[int, Any]] = field(default_factory=list)
-    is_working: threading.Condition = field(default_factory=threading.Condition)
+    queue: Queue = field(default_factory=partial(Queue, maxsize=100))  # (cmd, Future)
+    ready_event: threading.Event = field(default_factory=threading.Event)
 
 
 class EmulatedDeviceServer(threading.Thread):
@@ -102,111 +238,250 @@ class EmulatedDeviceServer(threading.Thread):
         self.device: EmulatedDeviceImplementation = None
         self._device_init_kwargs = device_kwargs or {}
         self._device_kind: EmulatedDeviceKind = device_kind
+        self._dispatch: dict[str, Callable[[tuple, dict], Any]] = {
+            '__gen_next__': self._gen_next,
+            '__gen_close__': self._gen_close,
+        }  # func_name: function evaluating it, built by `_compile` on first call
         self.verbose = False
 
     def run(self) -> None:
         """Continuously communicate with the underlying `_device`"""
         self.device = self._device_kind.cls(**self._device_init_kwargs)
+        self._device_kind.ready_event.set()
         thread_desc = f'{self.device.name} {self._device_kind.name} server thread'
         self._device_kind.log.info('Started ' + thread_desc)
         while True:
             try:
-                cmd = self._device_kind.queue.get(timeout=TIMEOUT)
+                cmd, future = self._device_kind.queue.get(timeout=TIMEOUT)
             except Empty:
                 if stop_program_event.is_set():
                     break
                 continue
-            with self._device_kind.is_working:
+            func_name = None  # unknown until `cmd` is validated
+
+            try:
+                if not isinstance(cmd, dict):  # e.g. 'exit' sent as framed payload
+                    raise TypeError(f'Command must be a dict, got {cmd!r}')
                 func_name = cmd.get('func_name', cmd.get('attr_name'))
                 args = cmd.get('args', ())
                 kwargs = cmd.get('kwargs', {})
+                ret = self.evaluate(func_name, args, kwargs)
+                status = 200
+                if inspect.isgenerator(ret):
+                    gen_id = uuid.uuid4().hex
+                    _generators[gen_id] = ret
+                    ret = {'__generator__': gen_id}
+            except Exception as e:
+                self._device_kind.log.error('eval %s failed', func_name, exc_info=True)
+                ret = (e.__class__.__name__, e.args)
+                status = 500
 
-                try:
-                    ret = self.evaluate(func_name, args, kwargs)
-                    status = 200
-                    if inspect.isgenerator(ret):
-                        gen_id = uuid.uuid4().hex
-                        _generators[gen_id] = ret
-                        ret = {'__generator__': gen_id}
-                except Exception as e:
-                    traceback.print_exc()
-                    self._device_kind.log.exception(e)
-                    ret = (e.__class__.__name__, e.args)
-                    status = 500
-
-                self._device_kind.response_cache.append((status, ret))
-                self._device_kind.is_working.notify()
-                self._device_kind.log.debug("%s  %s: %s" % (status, func_name, ret))
+            if isinstance(ret, Future):  # image is still being copied in background
+                ret.add_done_callback(partial(self._resolve, future, func_name))
+                continue
+            future.set_result((status, ret))
+            self._device_kind.log.debug('%d %s: %r', status, func_name, ret)
         self._device_kind.log.info('Terminating ' + thread_desc)
 
+    def _resolve(self, future: Future, func_name: str, pending: Future) -> None:
+        """Pass the result of a `pending` background task to request `future`"""
+        try:
+            ret = pending.result()
+            status = 200
+        except Exception as e:
+            self._device_kind.log.error('eval %s failed', func_name, exc_info=True)
+            ret = (e.__class__.__name__, e.args)
+            status = 500
+        future.set_result((status, ret))
+        self._device_kind.log.debug('%d %s: %r', status, func_name, ret)
+
     def evaluate(self, func_name: str, args: list, kwargs: dict) -> Any:
         """Eval function `func_name` on `self.device` with `args` & `kwargs`."""
-        self._device_kind.log.debug(f'eval {func_name}, {args}, {kwargs}')
-
-        if func_name == '__gen_next__':
-            gen = _generators[kwargs['id']]
-            try:
-                ret = next(gen)
-                SharedImageProxy.push(image=ret)
-                return {'name': NAME, 'shape': ret.shape, 'dtype': str(ret.dtype)}
-            except StopIteration:
-                del _generators[kwargs['id']]
-                return
-
-        if func_name == "__gen_close__":
-            _generators.pop(kwargs['id'], None)
-            return
+        self._device_kind.log.debug('eval %s, %s, %s', func_name, args, kwargs)
+        if (dispatch := self._dispatch.get(func_name)) is None:
+            dispatch = self._dispatch[func_name] = self._compile(func_name)
+        return dispatch(args, kwargs)
 
+    def _compile(self, func_name: str) -> Callable[[tuple, dict], Any]:
+        """Build a function that evaluates `func_name` for `args` & `kwargs`"""
         f = getattr(self.device, func_name)
-        ret = f(*args, **kwargs) if callable(f) else f
-
-        if func_name in {'get_image', }:
-            SharedImageProxy.push(image=ret)
-            ret = {'name': NAME, 'shape': ret.shape, 'dtype': str(ret.dtype)}
+        if not callable(f):  # values of attributes can change, so re-read them
+            return lambda args, kwargs: getattr(self.device, func_name)
+        if func_name in IMAGE_FUNCS:
+            return lambda args, kwargs: SharedImageProxy.push(image=f(*args, **kwargs))
+        return lambda args, kwargs: f(*args, **kwargs)
+
+    @staticmethod
+    def _gen_next(args: tuple, kwargs: dict) -> Any:
+        """Push the next image of generator `kwargs['id']` to shared memory"""
+        gen = _generators[kwargs['id']]
+        try:
+            return SharedImageProxy.push(image=next(gen))
+        except StopIteration:
+            del _generators[kwargs['id']]
+            return
 
-        return ret
+    @staticmethod
+    def _gen_close(args: tuple, kwargs: dict) -> None:
+        """Forget about generator `kwargs['id']`"""
+        _generators.pop(kwargs['id'], None)
+
+
+def _read_exact(
+    connection: socket.socket,
+    n: int,
+    buffer: bytearray,
+) -> Optional[memoryview]:
+    """Read exactly `n` bytes into `buffer`; return them or None if closed"""
+    view = memoryview(buffer)[:n]
+    offset = 0
+    while offset < n:
+        if not (received := connection.recv_into(view[offset:])):
+            return None
+        offset += received
+    return view
+
+
+def _receive(
+    connection: socket.socket,
+    buffer: bytearray,
+    framed: bool,
+) -> tuple[Optional[Union[bytes, memoryview]], bytearray]:
+    """Receive a single message, growing the reusable `buffer` if needed.
+    Framed messages are returned as a view of `buffer`, valid until the next
+    call. Return None if the connection was closed or asked to be closed"""
+    if not framed:  # legacy clients send each message in a single packet
+        return connection.recv(BUFFER_SIZE) or None, buffer
+    if (header := _read_exact(connection, COMMAND_HEADER.size, buffer)) is None:
+        return None, buffer
+    size, tag = COMMAND_HEADER.unpack(header)
+    if tag != TAG_PAYLOAD:  # control commands are never deserialized
+        return None, buffer
+    if size > len(buffer):
+        buffer = bytearray(1 << (size - 1).bit_length())
+    if (data := _read_exact(connection, size, buffer)) is None:
+        return None, buffer
+    return data, buffer
+
+
+def _iter_frames(connection: socket.socket) -> Iterator[bytearray]:
+    """Lazily read subsequent frames, i.e. out-of-band pickle buffers"""
+    header = bytearray(HEADER.size)
+    while True:
+        if _read_exact(connection, HEADER.size, header) is None:
+            raise ConnectionError('Connection closed while reading buffers')
+        (size,) = HEADER.unpack(header)
+        frame = bytearray(size)  # not reused: becomes memory of the loaded object
+        if _read_exact(connection, size, frame) is None:
+            raise ConnectionError('Connection closed while reading buffers')
+        yield frame
+
+
+def _load(
+    connection: socket.socket,
+    data: Union[bytes, memoryview],
+    framed: bool,
+) -> Any:
+    """Deserialize `data`, reading its out-of-band pickle buffers if `framed`"""
+    if PROTOCOL == 'pickle':  # reads memoryview directly, without a copy
+        buffers = _iter_frames(connection) if framed else None
+        return pickle.loads(data, buffers=buffers)
+    return loader(bytes(data))  # other loaders `.decode()` their input
+
+
+def _send(connection: socket.socket, response: Any, framed: bool) -> None:
+    """Serialize and send `response`, length-prefixed if `framed`. Framed
+    pickles pass large buffers i.e. arrays out-of-band, as separate frames"""
+    if (buffer := getattr(_send_buffers, 'buffer', None)) is None:
+        buffer = _send_buffers.buffer = io.BytesIO()
+    buffer.seek(0)  # no truncate: it would shrink the allocation; size is tracked
+    if framed:
+        buffer.write(bytes(HEADER.size))  # placeholder for the length prefix
+    out_of_band: list[pickle.PickleBuffer] = []
+    if PROTOCOL == 'pickle':
+        callback = out_of_band.append if framed else None
+        pickle.dump(response, buffer, protocol=5, buffer_callback=callback)
+    else:
+        buffer.write(dumper(response))
+    size = buffer.tell()
+    with buffer.getbuffer() as view, view[:size] as message:
+        if framed:
+            HEADER.pack_into(message, 0, size - HEADER.size)
+        connection.sendall(message)
+    for pickle_buffer in out_of_band:
+        with pickle_buffer.raw() as raw:
+            connection.sendall(HEADER.pack(raw.nbytes))
+            connection.sendall(raw)
 
 
 def handle(connection: socket.socket, device_kind: EmulatedDeviceKind) -> None:
     """Pass commands via connection on the queue to server, register response"""
     with connection:
-        while True:
-            if stop_program_event.is_set():
-                break
-
-            if not (data := connection.recv(BUFFER_SIZE)):
-                break
-
-            data = loader(data)
+        try:
+            # Framed clients announce themselves with `FRAMING_MAGIC`, a byte
+            # that messages serialized by any supported dumper never start with
+            framed = connection.recv(1, socket.MSG_PEEK) == FRAMING_MAGIC
+            if framed:
+                connection.recv(1)  # consume the already peeked magic byte
+            buffer = bytearray(BUFFER_SIZE)  # reused for the lifetime of connection
+            while True:
+                if stop_program_event.is_set():
+                    break
 
-            if data == 'exit' or data == 'kill':  # can't use "in", dict is unhashable
-                break
+                data, buffer = _receive(connection, buffer, framed)
+                if data is None:
+                    break
 
-            with device_kind.is_working:
-                device_kind.queue.put(data)
-                device_kind.is_working.wait()
-                response = device_kind.response_cache.pop()
-                connection.send(dumper(response))
+                data = _load(connection, data, framed)
 
+                if not framed and (data == 'exit' or data == 'kill'):  # dict unhashable
+                    break
 
-def listen_on(port: int, device_kind: EmulatedDeviceKind) -> None:
-    """Listen on a given port and handle incoming instructions"""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as device_client:
-        device_client.bind(("localhost", port))
-        device_client.settimeout(TIMEOUT)
-        device_client.listen()
+                future = Future()
+                device_kind.queue.put((data, future))
+                _send(connection, future.result(), framed)
+        except Exception as e:
+            device_kind.log.exception('Exception when handling connection: %s', e)
+
+
+def listen_on(
+    address: Union[int, str],
+    device_kind: EmulatedDeviceKind,
+    wakeup: socket.socket,
+) -> None:
+    """Listen on a given TCP port or Unix socket path and handle instructions
+    until `wakeup` socket, written to when the program stops, becomes readable"""
+    is_unix = isinstance(address, str)
+    family = socket.AF_UNIX if is_unix else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as device_client:
+        if is_unix:
+            if os.path.exists(address):  # stale socket file from previous run
+                os.unlink(address)
+            device_client.bind(address)
+        else:
+            if os.name not in ('nt', 'cygwin'):  # on Windows allows port hijacking
+                device_client.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            device_client.bind(("localhost", address))
+        device_client.listen(socket.SOMAXCONN)
+        selector = selectors.DefaultSelector()
+        selector.register(device_client, selectors.EVENT_READ)
+        selector.register(wakeup, selectors.EVENT_READ)
         device_kind.log.info(f'Started {device_kind.name} listener thread')
-        while True:
-            if stop_program_event.is_set():
-                break
-            try:
-                connection, _ = device_client.accept()
-                handle(connection, device_kind)
-            except socket.timeout:
-                pass
-            except Exception as e:
-                device_kind.log.exception('Exception when handling connection: %s', e)
-        device_kind.log.info(f'Terminating {device_kind.name} listener thread')
+        # the device itself is still accessed by a single server thread only
+        with selector, ThreadPoolExecutor(max_workers=CONNECTION_THREADS) as pool:
+            while not stop_program_event.is_set():
+                if any(key.fileobj is wakeup for key, _ in selector.select()):
+                    break
+                try:
+                    connection, _ = device_client.accept()
+                    if not is_unix:
+                        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    pool.submit(handle, connection, device_kind)
+                except Exception as e:
+                    device_kind.log.exception('Exception when accepting connection: %s', e)
+    if is_unix and os.path.exists(address):
+        os.unlink(address)
+    device_kind.log.info(f'Terminating {device_kind.name} listener thread')
 
 
 def main() -> None:
@@ -234,8 +509,41 @@ def main() -> None:
     - `args`: (Optional) List of arguments for the function (list)
     - `kwargs`: (Optional) Dictionary of keyword arguments for the function (dict)
 
+    By default, the sockets listen on TCP ports defined in instamatic config.
+    On platforms that support it, `--unix-sockets` switches both to AF_UNIX
+    sockets in the temporary directory, which avoids the TCP stack overhead
+    for clients running on the same machine and able to connect to them.
+
+    Clients that send a single null byte `FRAMING_MAGIC` right after
+    connecting open a framed connection: each message is then preceded by its
+    length as a 4-byte big-endian unsigned int, responses are framed likewise,
+    and commands can be of any size up to 4 GiB. Other clients are limited
+    to a single `BUFFER_SIZE` packet per command, as in instamatic.
+    Framed commands additionally carry a 1-byte tag after the length:
+    `TAG_PAYLOAD` for serialized commands, `TAG_EXIT` or `TAG_KILL` with no
+    payload to close the connection instead of sending 'exit' or 'kill'.
+    If instamatic uses the pickle protocol, framed messages are pickled with
+    protocol 5 and large contiguous buffers such as numpy array data are sent
+    out-of-band: each as a separate length-prefixed frame following the main
+    one, to be passed lazily to `pickle.loads(..., buffers=...)` in order.
+
     Other than the simulated camera images i.e. numpy arrays passed via
     a shared memory region, the response is returned as a serialized object.
+    Images are returned as a handle with the shared memory `name`, `shape`,
+    `dtype`, and `nbytes` of the image, alongside a `version` counter that
+    increases with every new frame. Consecutive images alternate between two
+    shared memory buffers, so that a client can still read the previous image
+    while the next one is being written; the image before that is overwritten,
+    so clients should copy each image before requesting the one after next.
+    Copying into shared memory runs in the background and only overlaps with
+    other camera commands if several clients use the camera concurrently:
+    instamatic's `CamClient` waits for every reply before sending anything.
+    The image is read by wrapping
+    `SharedMemory(name).buf` with `np.ndarray(shape, dtype, buffer=...)`.
+    With `--memmap-threshold`, larger images are written to a file instead and
+    the handle has `backend: memmap` and a `path` to open with `np.memmap`.
+    The file is overwritten in place by the next image of the same shape and
+    dtype, so clients should copy the image before requesting another one.
     """
 
     parser = ArgumentParser(description=main.__doc__)
@@ -247,7 +555,42 @@ def main() -> None:
         help='Log DEBUG messages in addition to standard INFO-level messages',
         default=0,
     )
+    parser.add_argument(
+        '-u',
+        '--unix-sockets',
+        action='store_true',
+        dest='unix_sockets',
+        help=f'Listen on Unix sockets {TEM_SOCKET_PATH} and {CAM_SOCKET_PATH} '
+        'instead of TCP ports; requires clients able to connect to them',
+        default=0,
+    )
+    parser.add_argument(
+        '-m',
+        '--memmap-threshold',
+        type=int,
+        dest='memmap_threshold',
+        metavar='MB',
+        help=f'Pass images larger than MB megabytes via memmap files '
+        f'{" and ".join(MEMMAP_PATHS)} rather than shared memory; '
+        'requires clients able to read them',
+        default=None,
+    )
     options = parser.parse_args()
+    if options.unix_sockets and not hasattr(socket, 'AF_UNIX'):
+        parser.error('Unix sockets are not supported on this platform')
+
+    # File I/O is done by `log_listener` thread; others only enqueue records
+    log_queue = Queue()
+    log_file_handler = logging.FileHandler(logfile)
+    log_file_handler.setFormatter(logging.Formatter(logging_fmt))
+    log_listener = logging.handlers.QueueListener(log_queue, log_file_handler)
+    # not `basicConfig`: it would give QueueHandler a format, applied twice
+    logging.getLogger().addHandler(logging.handlers.QueueHandler(log_queue))
+    logging.getLogger().setLevel(logging.INFO)
+    log_listener.start()
+
+    if options.memmap_threshold is not None:
+        SharedImageProxy.memmap_threshold = options.memmap_threshold * 1024 ** 2
     if options.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
@@ -259,20 +602,23 @@ def main() -> None:
     tem_server = EmulatedDeviceServer(device_kind=tem)
     tem_server.start()
 
-    for _ in tqdm(range(100), desc='Waiting for TEM device', leave=False):
-        if getattr(tem_server, 'device') is not None:  # wait until TEM initialized
-            break
-        time.sleep(0.05)
-    else:  # necessary check, Error extremely unlikely, TEM typically starts in ms
+    # necessary check, Error extremely unlikely, TEM typically starts in ms
+    if not tem.ready_event.wait(timeout=5.0):
         raise RuntimeError('Could not start TEM device on server in 5 seconds')
 
     cam_server = EmulatedDeviceServer(device_kind=cam, tem=tem_server.device)
     cam_server.start()
 
-    tem_listener = threading.Thread(target=listen_on, args=(TEM_PORT, tem))
+    tem_address = TEM_SOCKET_PATH if options.unix_sockets else TEM_PORT
+    # writing to `stop_writer` instantly wakes listeners waiting on `stop_reader`
+    stop_reader, stop_writer = socket.socketpair()
+    tem_listener_args = (tem_address, tem, stop_reader)
+    tem_listener = threading.Thread(target=listen_on, args=tem_listener_args)
     tem_listener.start()
 
-    cam_listener = threading.Thread(target=listen_on, args=(CAM_PORT, cam))
+    cam_address = CAM_SOCKET_PATH if options.unix_sockets else CAM_PORT
+    cam_listener_args = (cam_address, cam, stop_reader)
+    cam_listener = threading.Thread(target=listen_on, args=cam_listener_args)
     cam_listener.start()
 
     try:
@@ -281,12 +627,16 @@ def main() -> None:
         logging.info("Received KeyboardInterrupt, shutting down...")
     finally:
         stop_program_event.set()
+        stop_writer.send(b'\x00')  # never read, so wakes up every listener
         SharedImageProxy.release()
         tem_server.join()
         cam_server.join()
         tem_listener.join()
         cam_listener.join()
+        stop_reader.close()
+        stop_writer.close()
         logging.info(f'{NAME.title()} shutting down')
+        log_listener.stop()
         logging.shutdown()
 
 